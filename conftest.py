@@ -0,0 +1 @@
+# Keeps the repo root importable (e.g. `utils.trend_utils`) when running plain `pytest`
@@ -1,8 +1,10 @@
 import streamlit as st
 from utils.data_utils import get_competitors, load_competitor_data
+from utils.trend_utils import load_listing_daily, trend_mtime, filter_by_tags, compute_velocity, rank_growth
 import pandas as pd
 import plotly.express as px
 import logging
+import html
 
 # Configure logging
 logging.basicConfig(
@@ -11,6 +13,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+GROWTH_WINDOW_DAYS = 30
+
+
+# mtime arguments are only part of the cache keys, so results refresh when a trend store is updated
+@st.cache_data(show_spinner=False, max_entries=200)
+def cached_listing_daily(competitor, mtime):
+    return load_listing_daily(competitor)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def cached_growth_rankings(shop_mtimes):
+    return rank_growth([shop for shop, _ in shop_mtimes], GROWTH_WINDOW_DAYS)
+
+
+def format_growth_rate(rate):
+    return f'{rate:.0%}' if pd.notna(rate) else 'new'
+
+
 st.set_page_config(
     page_title="Explore Competitors", 
     page_icon="🔍",
@@ -53,6 +73,8 @@ else:
             # Convert date column to datetime if not already
             combined_df['date'] = pd.to_datetime(combined_df['date'])
             
+            selected_shapes, selected_styles, selected_types = [], [], []
+            
             # Add tag filtering if tag columns exist
             if all(col in combined_df.columns for col in ['shape_tags', 'style_tags', 'type_tags']):
                 # Create three columns for tag filters
@@ -164,6 +186,59 @@ else:
             )
             st.plotly_chart(fig, use_container_width=True)
             
+            # Review velocity and rating drift from the precomputed trend series
+            st.subheader("Review Velocity")
+            velocity_col1, velocity_col2 = st.columns(2)
+            with velocity_col1:
+                granularity = st.radio("Granularity", ["Daily", "Weekly"], horizontal=True)
+            with velocity_col2:
+                window = st.number_input("Rolling Window (periods)", min_value=1, max_value=90, value=7)
+            
+            freq = 'D' if granularity == "Daily" else 'W'
+            velocity_data = []
+            for competitor in selected_competitors:
+                listing_daily = cached_listing_daily(competitor, trend_mtime(competitor))
+                if listing_daily is None:
+                    st.warning(f"Trend data unavailable for {competitor}. Backfill it on the 'Add Competitors' page.")
+                    continue
+                listing_daily = filter_by_tags(listing_daily, selected_shapes, selected_styles, selected_types)
+                velocity = compute_velocity(listing_daily, freq=freq, window=window)
+                velocity['competitor'] = competitor
+                velocity_data.append(velocity)
+            
+            velocity_df = pd.concat(velocity_data, ignore_index=True) if velocity_data else pd.DataFrame(
+                columns=['date', 'reviews', 'rolling_reviews', 'rolling_rating', 'rating_drift', 'competitor']
+            )
+            velocity_df['date'] = pd.to_datetime(velocity_df['date'])
+            
+            if len(date_range) == 2:
+                start_date, end_date = date_range
+                # Weekly points are dated at the week start, so keep every week that overlaps the range
+                period_end = velocity_df['date'] + pd.Timedelta(days=6 if freq == 'W' else 0)
+                velocity_df = velocity_df[
+                    (period_end.dt.date >= start_date) & (velocity_df['date'].dt.date <= end_date)
+                ]
+            
+            fig_velocity = px.line(
+                velocity_df,
+                x='date',
+                y='rolling_reviews',
+                color='competitor',
+                title=f'{granularity} Review Velocity ({window}-period rolling average)',
+                labels={'date': 'Date', 'rolling_reviews': 'Reviews', 'competitor': 'Competitor'}
+            )
+            st.plotly_chart(fig_velocity, use_container_width=True)
+            
+            fig_drift = px.line(
+                velocity_df,
+                x='date',
+                y='rating_drift',
+                color='competitor',
+                title='Rating Drift (rolling average rating vs. all-time average)',
+                labels={'date': 'Date', 'rating_drift': 'Rating Drift', 'competitor': 'Competitor'}
+            )
+            st.plotly_chart(fig_drift, use_container_width=True)
+            
             # Show top 10 products
             st.subheader("Top 10 Products by Review Count")
             top_products = filtered_df['listing_title'].value_counts().head(10).reset_index()
@@ -274,4 +349,48 @@ else:
 
         else:
             logger.error(f"Error loading data for {selected_competitors}")
-            st.error(f"Error loading data for {selected_competitors}") 
\ No newline at end of file
+            st.error(f"Error loading data for {selected_competitors}")
+
+    # Rank listings and tags across every competitor from the precomputed trend stores
+    shop_mtimes = tuple((competitor, trend_mtime(competitor)) for competitor in competitors)
+    listing_growth, tag_growth, reference_date = cached_growth_rankings(shop_mtimes)
+    
+    missing_trends = [shop for shop, mtime in shop_mtimes if mtime is None]
+    if missing_trends:
+        st.caption(f"{len(missing_trends)} competitors have no trend data yet. Backfill it on the 'Add Competitors' page.")
+    
+    if reference_date is not None:
+        recent_label = f"{GROWTH_WINDOW_DAYS} Days to {reference_date.strftime('%Y-%m-%d')}"
+        prior_label = f"Previous {GROWTH_WINDOW_DAYS} Days"
+        st.caption(f"Growth compares the {GROWTH_WINDOW_DAYS} days up to {reference_date.strftime('%Y-%m-%d')}, "
+                   f"the latest review across all competitors, with the {GROWTH_WINDOW_DAYS} days before.")
+        
+        growth_col1, growth_col2 = st.columns(2)
+        
+        with growth_col1:
+            st.subheader("Fastest-Growing Competitor Listings")
+            growth_table = listing_growth.copy()
+            # Scraped titles and urls are escaped so the Visit link is the only raw HTML
+            growth_table['listing_title'] = growth_table['listing_title'].apply(
+                lambda x: html.escape(str(x)) if pd.notna(x) else ''
+            )
+            growth_table['Visit'] = growth_table['listing_url'].apply(
+                lambda x: f'<a href="{html.escape(str(x), quote=True)}" target="_blank">Visit Product</a>' if pd.notna(x) else ''
+            )
+            growth_table['growth_rate'] = growth_table['growth_rate'].apply(format_growth_rate)
+            growth_table = growth_table[['competitor', 'listing_title', 'recent_reviews', 'prior_reviews', 'growth_rate', 'Visit']]
+            growth_table.columns = ['Competitor', 'Product', recent_label, prior_label, 'Growth', 'Visit']
+            st.write(growth_table.to_html(escape=False, index=False), unsafe_allow_html=True)
+        
+        with growth_col2:
+            st.subheader("Fastest-Growing Tags by Competitor")
+            if not tag_growth.empty:
+                tag_table = tag_growth.copy()
+                tag_table['growth_rate'] = tag_table['growth_rate'].apply(format_growth_rate)
+                tag_table = tag_table[['competitor', 'category', 'tag', 'recent_reviews', 'prior_reviews', 'growth_rate']]
+                tag_table.columns = ['Competitor', 'Category', 'Tag', recent_label, prior_label, 'Growth']
+                st.dataframe(tag_table, use_container_width=True, hide_index=True)
+            else:
+                st.info("No tag trend data available yet.")
+    else:
+        st.info("No trend data available yet.")
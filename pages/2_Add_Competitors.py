@@ -1,5 +1,7 @@
 import streamlit as st
 from app import scrape_etsy_reviews, save_reviews_to_csv
+from utils.data_utils import get_competitors
+from utils.trend_utils import update_trends, trend_mtime
 import pandas as pd
 import os
 
@@ -43,6 +45,29 @@ if os.path.exists(data_dir):
 else:
     st.info("No data directory found.")
 
+# Backfill trend data for competitors scraped before trends existed
+st.subheader("Trend Data")
+competitors = get_competitors()
+missing_trends = [competitor for competitor in competitors if trend_mtime(competitor) is None]
+st.write(f"{len(competitors) - len(missing_trends)} of {len(competitors)} competitors have trend data.")
+rebuild = st.checkbox(
+    "Rebuild from scratch",
+    help="Recomputes trends from the latest scrape only. The current trend data is moved to a backup first."
+)
+
+if st.button("Backfill Trend Data"):
+    progress_bar = st.progress(0)
+    failed = []
+    for i, competitor in enumerate(competitors):
+        if update_trends(competitor, rebuild=rebuild) is None:
+            failed.append(competitor)
+        progress_bar.progress((i + 1) / len(competitors))
+    
+    if failed:
+        st.warning(f"Trend data could not be updated for: {', '.join(failed)}")
+    else:
+        st.success(f"Trend data is up to date for {len(competitors)} competitors.")
+
 # Add a separator
 st.markdown("---")
 
@@ -71,6 +96,10 @@ if st.button("Scrape Reviews"):
                 # Save to CSV
                 filename = save_reviews_to_csv(reviews, shop_name)
                 
+                # Fold the new reviews into the precomputed trend series
+                if update_trends(shop_name) is None:
+                    st.warning("Reviews were saved, but trend data could not be updated.")
+                
                 # Display success message
                 st.success(f"Successfully scraped {len(reviews)} reviews!")
                 
@@ -0,0 +1,240 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from utils import trend_utils
+
+
+def make_reviews(ids, date='2024-05-01 00:00:00', listing='Oval Engagement Ring'):
+    return [{
+        'review_id': review_id,
+        'user': f'user{i}',
+        'date': date,
+        'rating': 5,
+        'review_text': 'Lovely',
+        'listing_title': listing,
+        'listing_url': 'https://www.etsy.com/listing/1',
+        'avatar_url': None,
+        'shape_tags': "['oval']",
+        'style_tags': "['engagement']",
+        'type_tags': "['ring']",
+    } for i, review_id in enumerate(ids)]
+
+
+def write_source(reviews, shop='shop'):
+    os.makedirs('results', exist_ok=True)
+    path = f'results/etsy_{shop}_reviews.csv'
+    pd.DataFrame(reviews).to_csv(path, index=False)
+    # Make sure the mtime moves even when writes land in the same clock tick
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 1 + len(reviews)))
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def total_count(shop='shop'):
+    return int(trend_utils.load_listing_daily(shop)['count'].sum())
+
+
+def test_merge_daily_adds_counts():
+    existing = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-01', '2024-05-02']),
+        'category': ['shape', 'shape'],
+        'tag': ['oval', 'oval'],
+        'count': [2, 1],
+        'rating_sum': [9.0, 4.0],
+        'rating_count': [2, 1],
+    })
+    new_rows = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-02', '2024-05-03']),
+        'category': ['shape', 'shape'],
+        'tag': ['oval', 'oval'],
+        'count': [3, 1],
+        'rating_sum': [15.0, 5.0],
+        'rating_count': [3, 1],
+    })
+    merged = trend_utils._merge_daily(existing, new_rows, ['date', 'category', 'tag']).set_index('date')
+    assert merged['count'].tolist() == [2, 4, 1]
+    assert merged['rating_sum'].tolist() == [9.0, 19.0, 5.0]
+
+
+def test_overlapping_ingest_keeps_counts():
+    write_source(make_reviews([str(i) for i in range(1000, 1020)]))
+    assert trend_utils.update_trends('shop') == 20
+
+    write_source(make_reviews([str(i) for i in range(1010, 1025)]))
+    assert trend_utils.update_trends('shop') == 5
+    assert total_count() == 25
+
+
+def test_rescrape_with_missing_id_does_not_reingest():
+    write_source(make_reviews([str(i) for i in range(1000, 1020)]))
+    assert trend_utils.update_trends('shop') == 20
+
+    # One review without an id makes pandas infer a float column unless ids are read as str
+    write_source(make_reviews([str(i) for i in range(1000, 1020)] + [None]))
+    assert trend_utils.update_trends('shop') == 1
+    assert total_count() == 21
+
+
+def test_inconsistent_store_is_rebuilt():
+    write_source(make_reviews([str(i) for i in range(1000, 1020)]))
+    trend_utils.update_trends('shop')
+
+    # Simulate an update that wrote the aggregates but stopped before the meta file
+    paths = trend_utils._trend_paths('shop')
+    with open(paths['meta'], 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['review_total'] = 40
+    meta['source_mtime'] = None
+    with open(paths['meta'], 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    assert trend_utils.update_trends('shop') == 20
+    assert total_count() == 20
+
+
+def test_corrupt_meta_does_not_raise():
+    write_source(make_reviews(['1', '2']))
+    os.makedirs(trend_utils.TRENDS_DIR, exist_ok=True)
+    with open(trend_utils._trend_paths('shop')['meta'], 'w', encoding='utf-8') as f:
+        f.write('{not json')
+
+    assert trend_utils.update_trends('shop') == 2
+    assert total_count() == 2
+
+
+def test_missing_source_returns_none():
+    assert trend_utils.update_trends('missing') is None
+    assert trend_utils.load_listing_daily('missing') is None
+
+
+def test_growth_uses_shared_reference_date():
+    daily = pd.DataFrame({
+        'date': pd.to_datetime(['2022-01-10', '2022-01-20']),
+        'listing_title': ['Old Burst', 'Old Burst'],
+        'count': [10, 10],
+    })
+    assert trend_utils.compute_growth(daily, ['listing_title'])['recent_reviews'].tolist() == [20]
+    assert trend_utils.compute_growth(daily, ['listing_title'], reference_date='2024-05-01').empty
+
+
+def test_weekly_velocity_is_labelled_at_week_start():
+    daily = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-01', '2024-05-02']),
+        'count': [1, 2],
+        'rating_sum': [5.0, 8.0],
+        'rating_count': [1, 2],
+    })
+    velocity = trend_utils.compute_velocity(daily, freq='W', window=1)
+    assert velocity['reviews'].tolist() == [3]
+    assert velocity['date'].tolist() == [pd.Timestamp('2024-04-28')]
+
+
+def test_daily_velocity_fills_gap_days():
+    daily = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-01', '2024-05-03']),
+        'count': [1, 1],
+        'rating_sum': [5.0, 3.0],
+        'rating_count': [1, 1],
+    })
+    velocity = trend_utils.compute_velocity(daily, freq='D', window=2)
+    assert velocity['date'].tolist() == list(pd.date_range('2024-05-01', '2024-05-03'))
+    assert velocity['reviews'].tolist() == [1, 0, 1]
+    assert velocity['rolling_reviews'].tolist() == [1.0, 0.5, 0.5]
+    assert velocity['rolling_rating'].tolist() == [5.0, 5.0, 3.0]
+    assert velocity['rating_drift'].tolist() == [1.0, 1.0, -1.0]
+
+    single = trend_utils.compute_velocity(daily, freq='D', window=1)
+    assert pd.isna(single['rolling_rating'].iloc[1])
+    assert pd.isna(single['rating_drift'].iloc[1])
+
+
+def test_filter_by_tags_matches_any_within_and_all_across_categories():
+    daily = pd.DataFrame({
+        'listing_title': ['Oval Engagement Ring', 'Round Wedding Band', 'Oval Hoop Earrings'],
+        'shape_tags': ["['oval']", "['round']", "['oval']"],
+        'style_tags': ["['engagement']", "['wedding']", None],
+        'type_tags': ["['ring']", "['band']", "['earrings', 'hoop']"],
+    })
+    titles = lambda df: df['listing_title'].tolist()
+    assert titles(trend_utils.filter_by_tags(daily)) == titles(daily)
+    assert titles(trend_utils.filter_by_tags(daily, shapes=['oval', 'round'])) == titles(daily)
+    assert titles(trend_utils.filter_by_tags(daily, shapes=['oval'], types=['hoop'])) == ['Oval Hoop Earrings']
+    assert titles(trend_utils.filter_by_tags(daily, styles=['wedding'], shapes=['oval'])) == []
+
+
+def test_aggregate_tag_daily_counts_each_tag():
+    reviews = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-01', '2024-05-01', '2024-05-02']),
+        'rating': [5.0, 3.0, None],
+        'shape_tags': ["['oval']", "['oval', 'pear']", None],
+        'style_tags': [None, None, "['halo']"],
+        'type_tags': [None, None, None],
+    })
+    tags = trend_utils._aggregate_tag_daily(reviews).set_index(['date', 'category', 'tag'])
+    assert tags.loc[(pd.Timestamp('2024-05-01'), 'shape', 'oval'), 'count'] == 2
+    assert tags.loc[(pd.Timestamp('2024-05-01'), 'shape', 'oval'), 'rating_sum'] == 8.0
+    assert tags.loc[(pd.Timestamp('2024-05-01'), 'shape', 'pear'), 'count'] == 1
+    assert tags.loc[(pd.Timestamp('2024-05-02'), 'style', 'halo'), 'count'] == 1
+    assert tags.loc[(pd.Timestamp('2024-05-02'), 'style', 'halo'), 'rating_count'] == 0
+    assert len(tags) == 3
+
+
+def test_loaders_do_not_ingest():
+    write_source(make_reviews(['1', '2']))
+    assert trend_utils.load_listing_daily('shop') is None
+    assert not os.path.exists(trend_utils.TRENDS_DIR)
+
+
+def test_rebuild_backs_up_previous_store():
+    write_source(make_reviews(['1', '2']))
+    trend_utils.update_trends('shop')
+
+    write_source(make_reviews(['3']))
+    assert trend_utils.update_trends('shop', rebuild=True) == 1
+    assert total_count() == 1
+
+    backups = os.listdir(trend_utils.BACKUP_DIR)
+    assert len(backups) == 1
+    backed_up = pd.read_csv(os.path.join(trend_utils.BACKUP_DIR, backups[0], 'shop_listing_daily.csv'))
+    assert backed_up['count'].sum() == 2
+
+
+def test_lock_is_not_released_after_takeover():
+    os.makedirs(trend_utils.TRENDS_DIR, exist_ok=True)
+    lock_path = trend_utils._trend_paths('shop')['lock']
+    with trend_utils._shop_lock('shop'):
+        # Another process treats our lock as stale and takes it over
+        with open(lock_path, 'w', encoding='utf-8') as f:
+            f.write('other-holder')
+    assert os.path.exists(lock_path)
+
+    os.remove(lock_path)
+    with trend_utils._shop_lock('shop'):
+        assert os.path.exists(lock_path)
+    assert not os.path.exists(lock_path)
+
+
+def test_rank_growth_is_per_shop_with_integer_counts():
+    write_source(make_reviews(['1', '2', '3'], date='2024-05-01 00:00:00'), shop='active')
+    write_source(make_reviews(['1', '2'], date='2022-01-01 00:00:00', listing='Pear Halo Ring'), shop='stale')
+    write_source(make_reviews(['1'], date='2024-04-20 00:00:00'), shop='quiet')
+    for shop in ['active', 'stale', 'quiet']:
+        trend_utils.update_trends(shop)
+
+    listing_growth, tag_growth, reference_date = trend_utils.rank_growth(['active', 'stale', 'quiet', 'missing'])
+    assert reference_date == pd.Timestamp('2024-05-01')
+    assert listing_growth['competitor'].tolist() == ['active', 'quiet']
+    assert listing_growth['recent_reviews'].tolist() == [3, 1]
+    for column in ['recent_reviews', 'prior_reviews', 'growth']:
+        assert pd.api.types.is_integer_dtype(listing_growth[column])
+        assert pd.api.types.is_integer_dtype(tag_growth[column])
+
+    oval = tag_growth[(tag_growth['category'] == 'shape') & (tag_growth['tag'] == 'oval')]
+    assert oval.set_index('competitor')['recent_reviews'].to_dict() == {'active': 3, 'quiet': 1}
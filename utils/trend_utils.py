@@ -0,0 +1,451 @@
+import pandas as pd
+import ast
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+
+TRENDS_DIR = 'results/trends'
+BACKUP_DIR = os.path.join(TRENDS_DIR, 'backups')
+TAG_COLUMNS = {'shape': 'shape_tags', 'style': 'style_tags', 'type': 'type_tags'}
+
+# Bump when the stored layout changes so existing stores are rebuilt
+STORE_VERSION = 2
+
+# The scraper stores this date when a review date can't be parsed
+UNPARSED_DATE = pd.Timestamp(1999, 1, 1)
+
+LOCK_TIMEOUT_SECONDS = 30
+STALE_LOCK_SECONDS = 300
+
+LISTING_DAILY_COLUMNS = ['date', 'listing_title', 'listing_url', 'shape_tags', 'style_tags', 'type_tags',
+                         'count', 'rating_sum', 'rating_count']
+TAG_DAILY_COLUMNS = ['date', 'category', 'tag', 'count', 'rating_sum', 'rating_count']
+SUM_COLUMNS = ['count', 'rating_sum', 'rating_count']
+
+
+def _source_path(shop_name):
+    return f'results/etsy_{shop_name}_reviews.csv'
+
+
+def _trend_paths(shop_name):
+    return {
+        'meta': os.path.join(TRENDS_DIR, f'{shop_name}_meta.json'),
+        'seen': os.path.join(TRENDS_DIR, f'{shop_name}_seen.json'),
+        'listing_daily': os.path.join(TRENDS_DIR, f'{shop_name}_listing_daily.csv'),
+        'tag_daily': os.path.join(TRENDS_DIR, f'{shop_name}_tag_daily.csv'),
+        'lock': os.path.join(TRENDS_DIR, f'{shop_name}.lock'),
+    }
+
+
+def source_mtime(shop_name):
+    source = _source_path(shop_name)
+    return os.path.getmtime(source) if os.path.exists(source) else None
+
+
+def trend_mtime(shop_name):
+    # The meta file is written last on every update, so its mtime versions the whole store
+    meta = _trend_paths(shop_name)['meta']
+    return os.path.getmtime(meta) if os.path.exists(meta) else None
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Failed to read trend file {path}: {str(e)}")
+        return None
+
+
+def _replace_file(path, write):
+    # Write next to the target and swap it in, so readers never see a half-written file
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+    _replace_file(path, write)
+
+
+def _write_csv(path, df):
+    _replace_file(path, lambda tmp_path: df.to_csv(tmp_path, index=False))
+
+
+@contextmanager
+def _shop_lock(shop_name):
+    path = _trend_paths(shop_name)['lock']
+    token = f'{os.getpid()}-{uuid.uuid4().hex}'
+    deadline = time.time() + LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                    logging.warning(f"Removing stale trend lock for {shop_name}")
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for trend lock of {shop_name}")
+            time.sleep(0.1)
+    try:
+        os.write(fd, token.encode('utf-8'))
+        os.close(fd)
+        yield
+    finally:
+        # Only release our own lock; another process may have taken it over as stale
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                holder = f.read()
+            if holder == token:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _load_daily(path, columns):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _empty_series():
+    return pd.DataFrame(columns=LISTING_DAILY_COLUMNS), pd.DataFrame(columns=TAG_DAILY_COLUMNS)
+
+
+def _text_column(df, name):
+    if name not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[name].astype(str)
+
+
+def _review_keys(df):
+    # Fall back to user/date/listing when a review has no id
+    fallback = _text_column(df, 'user') + '|' + _text_column(df, 'date') + '|' + _text_column(df, 'listing_title')
+    if 'review_id' not in df.columns:
+        return fallback
+    # review_id must be read as str, otherwise one missing id turns every "1000" into "1000.0"
+    review_ids = df['review_id'].astype('string').str.strip()
+    return review_ids.where(review_ids.notna() & (review_ids != ''), fallback).astype(str)
+
+
+def _parse_tags(tags):
+    if isinstance(tags, list):
+        return tags
+    if isinstance(tags, str):
+        try:
+            parsed = ast.literal_eval(tags)
+        except (ValueError, SyntaxError):
+            return []
+        return parsed if isinstance(parsed, list) else []
+    return []
+
+
+def _merge_daily(existing, new_rows, keys):
+    # Aggregated counts and rating sums are additive, so new reviews are folded in without a rebuild
+    if existing.empty:
+        return new_rows
+    if new_rows.empty:
+        return existing
+    combined = pd.concat([existing, new_rows], ignore_index=True)
+    agg = {col: 'sum' for col in SUM_COLUMNS}
+    for col in combined.columns:
+        if col not in agg and col not in keys:
+            agg[col] = 'last'
+    return combined.groupby(keys, as_index=False, dropna=False).agg(agg)
+
+
+def _aggregate_listing_daily(reviews):
+    reviews = reviews.copy()
+    for col in ['listing_title', 'listing_url', *TAG_COLUMNS.values()]:
+        if col not in reviews.columns:
+            reviews[col] = None
+    grouped = reviews.groupby(['date', 'listing_title'], as_index=False, dropna=False).agg(
+        listing_url=('listing_url', 'last'),
+        shape_tags=('shape_tags', 'last'),
+        style_tags=('style_tags', 'last'),
+        type_tags=('type_tags', 'last'),
+        count=('rating', 'size'),
+        rating_sum=('rating', 'sum'),
+        rating_count=('rating', 'count'),
+    )
+    return grouped[LISTING_DAILY_COLUMNS]
+
+
+def _aggregate_tag_daily(reviews):
+    rows = []
+    for category, column in TAG_COLUMNS.items():
+        if column not in reviews.columns:
+            continue
+        exploded = reviews[['date', 'rating']].assign(tag=reviews[column].apply(_parse_tags)).explode('tag')
+        exploded = exploded.dropna(subset=['tag'])
+        if exploded.empty:
+            continue
+        grouped = exploded.groupby(['date', 'tag'], as_index=False).agg(
+            count=('rating', 'size'),
+            rating_sum=('rating', 'sum'),
+            rating_count=('rating', 'count'),
+        )
+        grouped['category'] = category
+        rows.append(grouped)
+    if not rows:
+        return pd.DataFrame(columns=TAG_DAILY_COLUMNS)
+    return pd.concat(rows, ignore_index=True)[TAG_DAILY_COLUMNS]
+
+
+def _backup_store(shop_name):
+    # Older scrapes only survive in the trend store, so keep it before starting over
+    paths = _trend_paths(shop_name)
+    existing = [paths[kind] for kind in ['meta', 'seen', 'listing_daily', 'tag_daily'] if os.path.exists(paths[kind])]
+    if not existing:
+        return None
+    backup_dir = os.path.join(BACKUP_DIR, f"{shop_name}_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}")
+    os.makedirs(backup_dir, exist_ok=True)
+    for path in existing:
+        shutil.move(path, os.path.join(backup_dir, os.path.basename(path)))
+    logging.warning(f"Moved trend store for {shop_name} to {backup_dir} before rebuilding")
+    return backup_dir
+
+
+def _is_current(meta, mtime):
+    return meta is not None and meta.get('version') == STORE_VERSION and meta.get('source_mtime') == mtime
+
+
+def _update_locked(shop_name, mtime, rebuild):
+    paths = _trend_paths(shop_name)
+    meta = _read_json(paths['meta'])
+    # Another session may have finished the same update while we waited for the lock
+    if not rebuild and _is_current(meta, mtime):
+        return 0
+
+    reviews = pd.read_csv(_source_path(shop_name), dtype={'review_id': str})
+
+    listing_daily = _load_daily(paths['listing_daily'], LISTING_DAILY_COLUMNS)
+    tag_daily = _load_daily(paths['tag_daily'], TAG_DAILY_COLUMNS)
+    seen_keys = _read_json(paths['seen'])
+
+    # The meta file is written last, so a store that disagrees with it was left by an interrupted update
+    consistent = (
+        meta is not None
+        and meta.get('version') == STORE_VERSION
+        and isinstance(seen_keys, list)
+        and int(listing_daily['count'].sum()) == meta.get('review_total')
+    )
+    if rebuild or not consistent:
+        if not rebuild and (meta is not None or os.path.exists(paths['listing_daily'])):
+            logging.warning(f"Trend store for {shop_name} is missing or inconsistent, rebuilding")
+        _backup_store(shop_name)
+        listing_daily, tag_daily = _empty_series()
+        seen_keys = []
+
+    keys = _review_keys(reviews)
+    seen_keys = set(seen_keys)
+    is_new = ~keys.isin(seen_keys) & ~keys.duplicated()
+    new_reviews = reviews[is_new].copy()
+    new_keys = keys[is_new]
+
+    new_reviews['date'] = pd.to_datetime(new_reviews['date'], errors='coerce').dt.normalize()
+    new_reviews['rating'] = pd.to_numeric(new_reviews['rating'], errors='coerce')
+    new_reviews = new_reviews[new_reviews['date'].notna() & (new_reviews['date'] != UNPARSED_DATE)]
+
+    if not new_reviews.empty:
+        listing_daily = _merge_daily(listing_daily, _aggregate_listing_daily(new_reviews), ['date', 'listing_title'])
+        tag_daily = _merge_daily(tag_daily, _aggregate_tag_daily(new_reviews), ['date', 'category', 'tag'])
+        listing_daily = listing_daily.sort_values('date')[LISTING_DAILY_COLUMNS]
+        tag_daily = tag_daily.sort_values('date')[TAG_DAILY_COLUMNS]
+
+    _write_csv(paths['listing_daily'], listing_daily)
+    _write_csv(paths['tag_daily'], tag_daily)
+    _write_json(paths['seen'], sorted(seen_keys.union(new_keys)))
+    _write_json(paths['meta'], {
+        'version': STORE_VERSION,
+        'source_mtime': mtime,
+        'review_total': int(listing_daily['count'].sum()),
+    })
+
+    logging.info(f"Ingested {len(new_keys)} new reviews into trends for {shop_name}")
+    return len(new_keys)
+
+
+def update_trends(shop_name, rebuild=False):
+    """Fold reviews not seen before into the shop's precomputed daily series.
+
+    Returns the number of new reviews ingested, or None if the update failed.
+    The raw CSV is only read when its modification time differs from the one
+    recorded on the last update. Pass `rebuild=True` to recompute from scratch.
+
+    The scraper overwrites the raw CSV, so a rebuild (forced, after a store
+    version bump, or when the store is inconsistent) only sees the latest
+    scrape. The previous store is moved to `BACKUP_DIR` first.
+    """
+    mtime = source_mtime(shop_name)
+    if mtime is None:
+        logging.warning(f"No review data found for {shop_name}, skipping trend update")
+        return None
+
+    if not rebuild and _is_current(_read_json(_trend_paths(shop_name)['meta']), mtime):
+        return 0
+
+    try:
+        os.makedirs(TRENDS_DIR, exist_ok=True)
+        with _shop_lock(shop_name):
+            return _update_locked(shop_name, mtime, rebuild)
+    except Exception as e:
+        logging.error(f"Failed to update trends for {shop_name}: {str(e)}")
+        return None
+
+
+def _load_stored(shop_name, kind, columns):
+    # Read-only: ingestion happens in update_trends, never while rendering a page
+    paths = _trend_paths(shop_name)
+    meta = _read_json(paths['meta'])
+    if meta is None or meta.get('version') != STORE_VERSION:
+        logging.warning(f"No current trend data for {shop_name}")
+        return None
+    try:
+        return _load_daily(paths[kind], columns)
+    except Exception as e:
+        logging.error(f"Failed to load {kind} trends for {shop_name}: {str(e)}")
+        return None
+
+
+def load_listing_daily(shop_name):
+    return _load_stored(shop_name, 'listing_daily', LISTING_DAILY_COLUMNS)
+
+
+def load_tag_daily(shop_name):
+    return _load_stored(shop_name, 'tag_daily', TAG_DAILY_COLUMNS)
+
+
+def filter_by_tags(listing_daily, shapes=None, styles=None, types=None):
+    """Keep listings matching any selected tag in each category, like the Explore tag filters."""
+    mask = pd.Series(True, index=listing_daily.index)
+    for column, selected in [('shape_tags', shapes), ('style_tags', styles), ('type_tags', types)]:
+        if selected:
+            mask &= listing_daily[column].apply(lambda x: any(tag in _parse_tags(x) for tag in selected))
+    return listing_daily[mask]
+
+
+def compute_velocity(daily, freq='D', window=7):
+    """Review velocity for a daily series, resampled to `freq` ('D' or 'W').
+
+    Weekly points are labelled with the first day of the week. Rating drift is
+    the rolling average rating minus the all-time average.
+    """
+    columns = ['date', 'reviews', 'rolling_reviews', 'rolling_rating', 'rating_drift']
+    if daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    series = daily.groupby('date')[SUM_COLUMNS].sum()
+    series = series.resample(freq, closed='left', label='left').sum()
+
+    velocity = pd.DataFrame(index=series.index)
+    velocity['reviews'] = series['count']
+    velocity['rolling_reviews'] = series['count'].rolling(window, min_periods=1).mean()
+    rolling_sum = series['rating_sum'].rolling(window, min_periods=1).sum()
+    rolling_count = series['rating_count'].rolling(window, min_periods=1).sum()
+    velocity['rolling_rating'] = rolling_sum / rolling_count.where(rolling_count > 0)
+    overall_rating = series['rating_sum'].sum() / series['rating_count'].sum() if series['rating_count'].sum() else float('nan')
+    velocity['rating_drift'] = velocity['rolling_rating'] - overall_rating
+
+    velocity.index.name = 'date'
+    return velocity.reset_index()[columns]
+
+
+def compute_growth(daily, keys, window_days=30, reference_date=None):
+    """Compare review counts in the window ending at `reference_date` against the window before it.
+
+    `reference_date` defaults to the latest date in `daily`; pass a shared date
+    when ranking several shops together.
+    """
+    columns = keys + ['recent_reviews', 'prior_reviews', 'growth', 'growth_rate']
+    if daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    reference_date = pd.Timestamp(reference_date) if reference_date is not None else daily['date'].max()
+    recent_start = reference_date - pd.Timedelta(days=window_days)
+    prior_start = recent_start - pd.Timedelta(days=window_days)
+
+    recent_mask = (daily['date'] > recent_start) & (daily['date'] <= reference_date)
+    prior_mask = (daily['date'] > prior_start) & (daily['date'] <= recent_start)
+    recent = daily[recent_mask].groupby(keys, dropna=False)['count'].sum()
+    prior = daily[prior_mask].groupby(keys, dropna=False)['count'].sum()
+
+    growth = pd.concat([recent.rename('recent_reviews'), prior.rename('prior_reviews')], axis=1).fillna(0)
+    if growth.empty:
+        return pd.DataFrame(columns=columns)
+    growth[['recent_reviews', 'prior_reviews']] = growth[['recent_reviews', 'prior_reviews']].astype(int)
+    growth['growth'] = growth['recent_reviews'] - growth['prior_reviews']
+    growth['growth_rate'] = growth['growth'] / growth['prior_reviews'].where(growth['prior_reviews'] > 0)
+    growth = growth.reset_index().sort_values(['growth', 'recent_reviews'], ascending=False)
+    return growth[columns]
+
+
+def rank_growth(shop_names, window_days=30, top_n=20):
+    """Rank listings and tags of several shops by growth over one shared window.
+
+    The window ends at the latest review across all shops, so a shop that went
+    quiet can't rank on an old burst. Returns `(listing_growth, tag_growth,
+    reference_date)`; shops without trend data are skipped.
+    """
+    listing_series = {}
+    tag_series = {}
+    for shop_name in shop_names:
+        listing_daily = load_listing_daily(shop_name)
+        tag_daily = load_tag_daily(shop_name)
+        if listing_daily is not None and not listing_daily.empty:
+            listing_series[shop_name] = listing_daily
+        if tag_daily is not None and not tag_daily.empty:
+            tag_series[shop_name] = tag_daily
+
+    listing_columns = ['competitor', 'listing_title', 'listing_url', 'recent_reviews', 'prior_reviews', 'growth', 'growth_rate']
+    tag_columns = ['competitor', 'category', 'tag', 'recent_reviews', 'prior_reviews', 'growth', 'growth_rate']
+    if not listing_series:
+        return pd.DataFrame(columns=listing_columns), pd.DataFrame(columns=tag_columns), None
+
+    reference_date = max(daily['date'].max() for daily in listing_series.values())
+
+    listing_growth = []
+    for shop_name, listing_daily in listing_series.items():
+        growth = compute_growth(listing_daily, ['listing_title'], window_days, reference_date)
+        if growth.empty:
+            continue
+        growth['listing_url'] = growth['listing_title'].map(listing_daily.groupby('listing_title')['listing_url'].last())
+        growth['competitor'] = shop_name
+        listing_growth.append(growth)
+
+    tag_growth = []
+    for shop_name, tag_daily in tag_series.items():
+        growth = compute_growth(tag_daily, ['category', 'tag'], window_days, reference_date)
+        if growth.empty:
+            continue
+        growth['competitor'] = shop_name
+        tag_growth.append(growth)
+
+    def top(frames, columns):
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        ranked = pd.concat(frames, ignore_index=True).sort_values(['growth', 'recent_reviews'], ascending=False)
+        return ranked.head(top_n)[columns].reset_index(drop=True)
+
+    return top(listing_growth, listing_columns), top(tag_growth, tag_columns), reference_date